@@ -11,20 +11,27 @@ Version: 0.1.1
 
 import os
 import sys
+import atexit
 import time
 import logging
-import pandas as pd
-import glob
+from logging.handlers import RotatingFileHandler
 import csv
 from pathlib import Path
 from datetime import datetime, timedelta
-import json
 import requests
-import html
+from requests.adapters import HTTPAdapter
 import configparser
 import argparse
-from typing import Optional, Tuple, Dict, Any
+import queue
+import threading
+from typing import Optional, Tuple, Dict, Any, Callable, List
 import re
+import random
+
+try:
+    from watchfiles import watch, Change
+except ImportError:  # Fall back to polling when watchfiles is not installed
+    watch = None
 
 # Constants
 DEFAULT_CONFIG = {
@@ -32,15 +39,18 @@ DEFAULT_CONFIG = {
         'log_folder': "C:/BioTimeLogs",
         'sent_log_file': "sent_sms_tracker.txt",
         'polling_interval': "60",
+        'use_polling': "false",
         'max_retries': "3",
-        'retry_delay': "10"
+        'retry_delay': "10",
+        'log_level': "INFO"
     },
     'sms_gateway': {
         'url': 'your sms provider url',
         'username': 'username',
         'password': 'password',
         'senderid': 'senderid',
-        'timeout': '5'
+        'timeout': '5',
+        'workers': '4'
     },
     'messages': {
         'check_in': 'Dear parent, {name} has reached school at {time}',
@@ -49,12 +59,27 @@ DEFAULT_CONFIG = {
     }
 }
 
+# Gateway responses worth retrying; other errors fail straight away
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Upper bound in seconds for a single wait between SMS attempts
+MAX_RETRY_DELAY = 60
+
+# Date field in a BioTime log line (YYYY-MM-DD)
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# Bytes read from the end of a log file to find its last complete line
+TAIL_READ_BYTES = 8192
+
+# Seconds a log must keep the same size before an unterminated last row is read
+SETTLE_SECONDS = 2.0
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('biotime_sms_notifier.log'),
+        RotatingFileHandler('biotime_sms_notifier.log', maxBytes=10_000_000, backupCount=3),
         logging.StreamHandler()
     ]
 )
@@ -63,9 +88,13 @@ logger = logging.getLogger(__name__)
 class ConfigManager:
     """Handles configuration loading and management"""
     
+    __slots__ = ('config_path', 'config', '_flat')
+    
     def __init__(self, config_path: str = "config.ini"):
         self.config_path = config_path
-        self.config = configparser.ConfigParser()
+        # Values are used verbatim; no %-interpolation in message templates
+        self.config = configparser.ConfigParser(interpolation=None)
+        self._flat: Dict[Tuple[str, str], str] = {}
         
         if not os.path.exists(self.config_path):
             self._create_default_config()
@@ -83,6 +112,18 @@ class ConfigManager:
         """Load configuration from file"""
         try:
             self.config.read(self.config_path)
+            # Snapshot every value so lookups are a single dict access
+            self._flat = {
+                (section, key): value
+                for section in self.config.sections()
+                for key, value in self.config.items(section)
+            }
+            for (section, key), value in self._flat.items():
+                if '%%' in value:
+                    logger.warning(
+                        f"Config value {section}.{key} contains '%%'; values are read "
+                        f"literally, so write a single '%' instead"
+                    )
             logger.info(f"Loaded configuration from {self.config_path}")
         except Exception as e:
             logger.error(f"Failed to load config: {str(e)}")
@@ -90,19 +131,42 @@ class ConfigManager:
     
     def get(self, section: str, key: str, default: Any = None) -> Any:
         """Get configuration value with optional default"""
-        try:
-            return self.config.get(section, key)
-        except (configparser.NoSectionError, configparser.NoOptionError):
-            return default  #Return the default value if specified
+        return self._flat.get((section, key), default)
     
     def getint(self, section: str, key: str, default: Any = None) -> int:
         """Get integer configuration value with optional default"""
+        value = self._flat.get((section, key))
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                if default is None:
+                    raise
+        elif default is None:
+            raise configparser.NoOptionError(key, section)
+        return int(default)
+    
+    def getboolean(self, section: str, key: str, default: Any = None) -> bool:
+        """Get boolean configuration value with optional default"""
+        value = self._flat.get((section, key))
+        if value is not None:
+            try:
+                return self._to_bool(value)
+            except ValueError:
+                if default is None:
+                    raise
+        elif default is None:
+            raise configparser.NoOptionError(key, section)
+        return self._to_bool(default)
+    
+    def _to_bool(self, value: Any) -> bool:
+        """Convert a config value (or a default like "false") to bool"""
+        if isinstance(value, bool):
+            return value
         try:
-            return self.config.getint(section, key)
-        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
-            if default is not None:
-                return int(default)
-            raise
+            return self.config.BOOLEAN_STATES[str(value).strip().lower()]
+        except KeyError:
+            raise ValueError(f"Not a boolean: {value}")
     
     def validate_config(self) -> bool:
         """Validate required configuration values"""
@@ -125,11 +189,43 @@ class ConfigManager:
 class SMSGateway:
     """Handles SMS sending operations"""
     
+    __slots__ = (
+        'config', 'timeout', 'max_retries', 'retry_delay', 'url',
+        'session', '_payload_template'
+    )
+    
     def __init__(self, config: ConfigManager):
         self.config = config
         self.timeout = config.getint('sms_gateway', 'timeout', 5)
         self.max_retries = config.getint('general', 'max_retries', 3)
         self.retry_delay = config.getint('general', 'retry_delay', 10)
+        self.url = config.get('sms_gateway', 'url')
+        
+        # One keep-alive session so consecutive SMS reuse the gateway connection.
+        # Retries are handled in send_sms so every wait gets backoff and jitter.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Credentials are fixed for the process; only number/message vary per SMS.
+        # The body is JSON, so json= handles escaping.
+        self._payload_template = {
+            "method": "SendSms",
+            "userdata": {
+                "username": config.get('sms_gateway', 'username'),
+                "password": config.get('sms_gateway', 'password')
+            },
+            "msgdata": [{
+                "senderid": config.get('sms_gateway', 'senderid'),
+                "priority": "0"
+            }]
+        }
+    
+    def close(self) -> None:
+        """Release the pooled gateway connections"""
+        self.session.close()
     
     def send_sms(self, phone_number: str, message: str) -> bool:
         """
@@ -142,166 +238,405 @@ class SMSGateway:
         Returns:
             bool: True if SMS was sent successfully, False otherwise
         """
-        url = self.config.get('sms_gateway', 'url')
-        password = self.config.get('sms_gateway', 'password')
-        username = self.config.get('sms_gateway', 'username')
-        senderid = self.config.get('sms_gateway', 'senderid')
-        
-        data = {
-            "method": "SendSms",
-            "userdata": {
-                "username": html.escape(username),
-                "password": html.escape(password)
-            },
-            "msgdata": [{
-                "number":html.escape(phone_number),
-                "message":html.escape(message),
-                "senderid":html.escape(senderid),
-                "priority":"0"
-            }]
-        }
-        
-        data_in_json = json.dumps(data)
+        # Copy the template so concurrent workers never share a msgdata entry
+        data = {**self._payload_template}
+        data["msgdata"] = [{
+            **self._payload_template["msgdata"][0],
+            "number": phone_number,
+            "message": message
+        }]
         
         for attempt in range(self.max_retries):
             try:
-                response = requests.post(url, data=data_in_json, timeout=self.timeout)
-                response.raise_for_status()
-                
-                logger.info(f"SMS sent to {phone_number}. Response: {response.text}")
-                return True
+                response = self.session.post(self.url, json=data, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    
+                    logger.info("SMS sent to %s. Response: %s", phone_number, response.text)
+                    return True
+                reason = f"gateway returned HTTP {response.status_code}"
                 
-            except requests.exceptions.RequestException as e:
-                logger.warning(
-                    f"Attempt {attempt + 1}/{self.max_retries} failed for {phone_number}: {str(e)}"
+            except requests.exceptions.HTTPError as e:
+                # Not a retryable status, so this was the only attempt
+                logger.error(
+                    f"Failed to send SMS to {phone_number}: gateway returned HTTP "
+                    f"{e.response.status_code}: {e.response.text}"
                 )
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                continue
+                return False
+            except requests.exceptions.RequestException as e:
+                reason = str(e)
+            
+            logger.warning(
+                f"Attempt {attempt + 1}/{self.max_retries} failed for {phone_number}: {reason}"
+            )
+            if attempt < self.max_retries - 1:
+                time.sleep(self._backoff(attempt))
         
-        logger.error(f"Failed to send SMS to {phone_number} after {self.max_retries} attempts")
+        logger.error(f"Failed to send SMS to {phone_number}: gave up after {self.max_retries} attempts")
         return False
+    
+    def _backoff(self, attempt: int) -> float:
+        """Seconds to wait before the next attempt: exponential with jitter, capped"""
+        # Jitter spreads out clients that all failed against a busy gateway
+        return min(
+            self.retry_delay * (2 ** attempt) + random.uniform(0, self.retry_delay),
+            MAX_RETRY_DELAY
+        )
+
+class SMSDispatcher:
+    """Sends queued SMS concurrently on a small pool of worker threads"""
+    
+    __slots__ = ('sms_gateway', '_queue', '_workers')
+    
+    def __init__(self, sms_gateway: SMSGateway, workers: int = 4):
+        self.sms_gateway = sms_gateway
+        self._queue = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"sms-worker-{i}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def submit(self, phone_number: str, message: str, on_done: Callable[[bool], None]) -> None:
+        """Queue an SMS; on_done is called with the send result from a worker thread"""
+        self._queue.put((phone_number, message, on_done))
+    
+    def _worker(self) -> None:
+        """Send queued SMS until a stop sentinel is received"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                phone_number, message, on_done = item
+                try:
+                    sent = self.sms_gateway.send_sms(phone_number, message)
+                except Exception as e:
+                    logger.error(f"SMS worker error: {str(e)}")
+                    sent = False
+                # Always report back so the caller can release its pending key
+                on_done(sent)
+            except Exception as e:
+                logger.error(f"SMS worker error: {str(e)}")
+            finally:
+                self._queue.task_done()
+    
+    def close(self) -> None:
+        """Send everything already queued, then stop the workers"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
 
 class LogProcessor:
     """Processes BioTime log files and manages sent message tracking"""
     
-    def __init__(self, config: ConfigManager, sms_gateway: SMSGateway):
+    __slots__ = (
+        'config', 'sms_gateway', 'log_folder', 'sent_log_file', 'csv_file',
+        'dispatcher', '_contacts_cache', '_tail_state', '_partial',
+        '_today_cache', '_tracker_lock', '_sent', '_tracker_fh', '_pending',
+        '_templates'
+    )
+    
+    def __init__(
+        self,
+        config: ConfigManager,
+        sms_gateway: SMSGateway,
+        tail_state: Optional[Dict[str, Tuple[int, int]]] = None
+    ):
         self.config = config
         self.sms_gateway = sms_gateway
         self.log_folder = config.get('general', 'log_folder')
         self.sent_log_file = config.get('general', 'sent_log_file')
         self.csv_file = os.path.join(self.log_folder, "parent_contact.csv")
+        self._contacts_cache: Optional[Tuple[int, Dict[str, Tuple[str, str]]]] = None
+        # Log path -> (inode, bytes already read); pass the previous processor's
+        # state when restarting so reading resumes where it stopped
+        self._tail_state: Dict[str, Tuple[int, int]] = {} if tail_state is None else tail_state
+        # Log key -> (path, size, first seen) while its last row has no newline yet
+        self._partial: Dict[str, Tuple[str, int, float]] = {}
+        self._templates = {
+            'in': config.get('messages', 'check_in', DEFAULT_CONFIG['messages']['check_in']),
+            'out': config.get('messages', 'check_out', DEFAULT_CONFIG['messages']['check_out'])
+        }
         
         # Ensure required directories exist
         os.makedirs(self.log_folder, exist_ok=True)
         
-        # Initialize sent log file if it doesn't exist
-        if not os.path.exists(self.sent_log_file):
-            with open(self.sent_log_file, 'w') as f:
-                pass
+        # (expires_at, YYYY-MM-DD) for the current day, see _today()
+        self._today_cache = (0.0, "")
+        self._tracker_lock = threading.Lock()
+        
+        # Load today's sent keys once; earlier days can never match again
+        self._sent = set()
+        if os.path.exists(self.sent_log_file):
+            today = self._today()
+            with open(self.sent_log_file, 'r') as f:
+                self._sent = {line for line in f.read().splitlines() if line.startswith(today)}
+        
+        # Keep the sent log open for appending (creates it if it doesn't exist).
+        # Line buffering pushes each key out as soon as its newline is written.
+        self._tracker_fh = open(self.sent_log_file, 'a', buffering=1)
+        atexit.register(self._tracker_fh.close)
+        
+        # Keys queued but not yet confirmed sent
+        self._pending = set()
+        
+        # Started last so a failure above cannot leave worker threads behind
+        self.dispatcher = SMSDispatcher(sms_gateway, config.getint('sms_gateway', 'workers', 4))
+    
+    def close(self) -> None:
+        """Flush queued SMS and release the sent log"""
+        self.dispatcher.close()
+        self._tracker_fh.close()
+        atexit.unregister(self._tracker_fh.close)
     
     def get_latest_csv(self) -> Optional[str]:
         """Get the most recent CSV file in the log folder"""
         try:
-            list_of_files = glob.glob(os.path.join(self.log_folder, '*.csv'))
-            if not list_of_files:
-                return None
-            return max(list_of_files, key=os.path.getctime)
+            with os.scandir(self.log_folder) as entries:
+                newest = max(
+                    (entry for entry in entries
+                     if entry.name.endswith('.csv') and entry.name != "parent_contact.csv"),
+                    key=lambda entry: entry.stat().st_mtime_ns,
+                    default=None
+                )
+            return newest.path if newest else None
         except Exception as e:
             logger.error(f"Error finding latest CSV: {str(e)}")
             return None
     
-    def read_last_line(self, csv_file: str) -> Optional[dict]:
-        """Read the last line of a CSV file and return relevant data as dict"""
+    def _log_files(self) -> List[str]:
+        """Paths of the BioTime log CSVs in the log folder"""
+        with os.scandir(self.log_folder) as entries:
+            return [
+                entry.path for entry in entries
+                if entry.name.endswith('.csv') and entry.name != "parent_contact.csv"
+            ]
+    
+    def baseline_logs(self) -> None:
+        """
+        Record how far each existing log has been written
+        
+        Called once at startup, so the first change to a log reads
+        everything appended after this point rather than replaying the file.
+        """
+        for csv_file in self._log_files():
+            # DirEntry.stat() reports st_ino as 0 on Windows; os.stat() has the real one
+            st = os.stat(csv_file)
+            self._tail_state[self._tail_key(csv_file)] = (
+                st.st_ino, self._complete_offset(csv_file, st.st_size)
+            )
+    
+    def catch_up(self) -> None:
+        """Process rows written to any log while monitoring was not running"""
+        for csv_file in self._log_files():
+            if not self.process_log_for(csv_file):
+                logger.warning(f"Failed to catch up on {csv_file}")
+    
+    def _tail_key(self, csv_file: str) -> str:
+        """Normalise a log path so watcher, poller and baseline agree on it"""
+        return os.path.normcase(os.path.abspath(csv_file))
+    
+    def _complete_offset(self, csv_file: str, size: int) -> int:
+        """Return the offset just past the last complete line of a log"""
+        start = max(0, size - TAIL_READ_BYTES)
+        with open(csv_file, 'rb') as f:
+            f.seek(start)
+            tail = f.read(size - start)
+        newline = tail.rfind(b'\n')
+        return start + newline + 1 if newline >= 0 else start
+    
+    def read_new_lines(self, csv_file: str) -> Optional[List[dict]]:
+        """
+        Return the complete entries appended to a log file since it was last read
+        
+        Only lines ending in a newline are consumed; a row BioTime is still
+        writing stays in the file until it is finished. An unterminated last
+        row is read once the file size has not changed for SETTLE_SECONDS,
+        since BioTime may never write its newline. A log that appears
+        after baseline_logs() is read from the start. A changed
+        inode or a shrunken file means the log was rotated or rewritten, and
+        it is read again from the start.
+        
+        Returns:
+            List of entries (empty if nothing was added), or None if new
+            lines were found but none held valid data
+        """
         try:
-            with open(csv_file, 'r', newline='') as f:
-                # Read all non-empty lines
-                lines = [line for line in csv.reader(f, delimiter='\t') if line]
-                if not lines:
-                    return None
-                
-                last_line = lines[-1]
-                
-                # Find emp_code - first non-empty field
-                emp_code = next((field for field in last_line if field.strip()), None)
-                
-                # Find date - looks like YYYY-MM-DD
-                date_str = next((field for field in last_line if re.match(r'\d{4}-\d{2}-\d{2}', field)), None)
-                
-                # Time should be right after date
-                time_index = last_line.index(date_str) + 1 if date_str else -1
-                time_str = last_line[time_index] if time_index < len(last_line) else None
-                
-                if not all([emp_code, date_str, time_str]):
-                    return None
-                    
-                return {
-                    'emp_code': emp_code.strip(),
-                    'date': date_str.strip(),
-                    'time': time_str.strip()
-                }
-                
+            st = os.stat(csv_file)
+            key = self._tail_key(csv_file)
+            prev = self._tail_state.get(key)
+            
+            prev_ino, offset = prev or (st.st_ino, 0)
+            if prev_ino == st.st_ino and st.st_size == offset:
+                return []
+            if prev_ino != st.st_ino or st.st_size < offset:
+                offset = 0
+            
+            with open(csv_file, 'rb') as f:
+                f.seek(offset)
+                new = f.read(st.st_size - offset)
+            end = new.rfind(b'\n') + 1
+            if end < len(new):
+                seen = self._partial.get(key)
+                now = time.monotonic()
+                if seen and seen[1] == st.st_size and now - seen[2] >= SETTLE_SECONDS:
+                    end = len(new)
+                    del self._partial[key]
+                elif not seen or seen[1] != st.st_size:
+                    self._partial[key] = (csv_file, st.st_size, now)
+            else:
+                self._partial.pop(key, None)
+            self._tail_state[key] = (st.st_ino, offset + end)
+            
+            lines = [line for line in new[:end].decode('utf-8', errors='replace').splitlines() if line.strip()]
+            entries = [
+                log_data for log_data in map(self._parse_fields, csv.reader(lines, delimiter='\t'))
+                if log_data
+            ]
+            return entries if entries or not lines else None
+            
         except Exception as e:
             logger.error(f"Error reading CSV file {csv_file}: {str(e)}")
-            return None    
-    def already_sent(self, emp_code: str, msg_type: str) -> bool:
-        """Check if message was already sent today"""
-        today_key = f"{time.strftime('%Y-%m-%d')}_{emp_code}_{msg_type}"
-        try:
-            if os.path.exists(self.sent_log_file):
-                with open(self.sent_log_file, 'r') as f:
-                    return today_key in f.read()
-            return False
-        except Exception as e:
-            logger.error(f"Error checking sent log: {str(e)}")
-            return True  # Assume sent to prevent duplicate messages
+            return None
     
-    def mark_as_sent(self, emp_code: str, msg_type: str) -> None:
-        """Record that a message was sent"""
-        today_key = f"{time.strftime('%Y-%m-%d')}_{emp_code}_{msg_type}"
-        try:
-            with open(self.sent_log_file, 'a') as f:
-                f.write(today_key + '\n')
-        except Exception as e:
-            logger.error(f"Error updating sent log: {str(e)}")
+    def partial_logs(self) -> List[str]:
+        """Paths of logs whose last row is still waiting to settle"""
+        return [path for path, _, _ in self._partial.values()]
     
-    def process_log(self) -> bool:
-        """Process the latest log file and send appropriate SMS"""
-        latest_file = self.get_latest_csv()
-        if not latest_file:
-            logger.warning("No CSV file found in log folder")
-            return False
+    def _parse_fields(self, fields: list) -> Optional[dict]:
+        """Extract emp_code, date and time from the fields of one log line"""
+        # Find emp_code - first non-empty field
+        emp_code = next((field for field in fields if field.strip()), None)
+        
+        # Find date - looks like YYYY-MM-DD
+        date_str = next((field for field in fields if _DATE_RE.match(field.strip())), None)
+        
+        # Time should be right after date
+        time_index = fields.index(date_str) + 1 if date_str else -1
+        time_str = fields[time_index] if time_index < len(fields) else None
+        
+        if not all([emp_code, date_str, time_str]):
+            return None
+            
+        return {
+            'emp_code': emp_code.strip(),
+            'date': date_str.strip(),
+            'time': time_str.strip()
+        }
+    
+    def _load_contacts(self) -> Optional[Dict[str, Tuple[str, str]]]:
+        """Return EmpCode -> (phone number, name), re-reading the CSV only when it changes"""
+        mtime_ns = os.stat(self.csv_file).st_mtime_ns
+        if self._contacts_cache and self._contacts_cache[0] == mtime_ns:
+            return self._contacts_cache[1]
         
-        log_data = self.read_last_line(latest_file)
-        if not log_data:
+        contacts = {}
+        with open(self.csv_file, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            required_columns = {'EmpCode', 'ParentNumber', 'Name'}
+            if not required_columns.issubset(reader.fieldnames or []):
+                logger.error(
+                    f"CSV file missing required columns. Needs: {required_columns}"
+                )
+                return None
+            
+            for row in reader:
+                # First row wins for duplicate codes
+                contacts.setdefault(
+                    (row['EmpCode'] or '').strip(),
+                    ((row['ParentNumber'] or '').strip(), (row['Name'] or '').strip())
+                )
+        
+        self._contacts_cache = (mtime_ns, contacts)
+        logger.info(f"Loaded {len(contacts)} contacts from {self.csv_file}")
+        return contacts
+    
+    def _today(self) -> str:
+        """Return today's date as YYYY-MM-DD, recomputed only after midnight"""
+        now = time.time()
+        if now >= self._today_cache[0]:
+            today = datetime.fromtimestamp(now).date()
+            midnight = datetime.combine(today + timedelta(days=1), datetime.min.time())
+            self._today_cache = (midnight.timestamp(), today.strftime('%Y-%m-%d'))
+            
+            # Yesterday's keys can never match again
+            with self._tracker_lock:
+                self._sent = {key for key in self._sent if key.startswith(self._today_cache[1])}
+        return self._today_cache[1]
+    
+    def _sent_key(self, emp_code: str, msg_type: str) -> str:
+        """Build the sent log key for a message sent today"""
+        return f"{self._today()}_{emp_code}_{msg_type}"
+    
+    def already_sent(self, today_key: str) -> bool:
+        """Check if message was already sent (or queued) today"""
+        return today_key in self._sent or today_key in self._pending
+    
+    def mark_as_sent(self, today_key: str) -> None:
+        """Record that a message was sent"""
+        with self._tracker_lock:
+            self._sent.add(today_key)
+            try:
+                self._tracker_fh.write(today_key + '\n')
+            except Exception as e:
+                logger.error(f"Error updating sent log: {str(e)}")
+    
+    def _on_sms_done(self, today_key: str, emp_code: str, msg_type: str, sent: bool) -> None:
+        """Record the outcome of a queued SMS"""
+        if sent:
+            self.mark_as_sent(today_key)
+            logger.debug("Successfully processed %s message for %s", msg_type, emp_code)
+        else:
+            logger.error(f"Failed to send SMS for {emp_code}")
+        self._pending.discard(today_key)
+    
+    def process_log_for(self, latest_file: str) -> bool:
+        """Process the lines added to the given log file and send appropriate SMS"""
+        entries = self.read_new_lines(latest_file)
+        if entries is None:
             logger.warning(f"Could not extract valid data from {latest_file}")
             return False
         
+        processed = True
+        for log_data in entries:
+            processed = self._process_entry(log_data) and processed
+        return processed
+    
+    def _process_entry(self, log_data: dict) -> bool:
+        """Send the appropriate SMS for one log entry"""
         try:
             emp_code = log_data['emp_code']
             date_str = log_data['date']
             time_str = log_data['time']
             timestamp_str = f"{date_str} {time_str}"
             
-            logger.info(f"Processing log for EmpCode: {emp_code}, Time: {timestamp_str}")
+            logger.debug("Processing log for EmpCode: %s, Time: %s", emp_code, timestamp_str)
+            
+            # A new, rotated or rewritten log is read from the start; rows from
+            # earlier days must not go out as today's SMS or take today's key
+            if date_str != self._today():
+                logger.debug("Skipping %s row for %s: not from today", date_str, emp_code)
+                return True
+            
             # Load and validate CSV data
             try:
-                df = pd.read_csv(self.csv_file)
-                required_columns = {'EmpCode', 'ParentNumber', 'Name'}
-                if not required_columns.issubset(df.columns):
-                    logger.error(
-                        f"CSV file missing required columns. Needs: {required_columns}"
-                    )
+                contacts = self._load_contacts()
+                if contacts is None:
                     return False
                 
-                matched = df[df["EmpCode"] == emp_code]
+                matched = contacts.get(emp_code)
                 
-                if not matched.empty:
-                    phone_number = str(matched.iloc[0]["ParentNumber"]).strip()
-                    name = matched.iloc[0]["Name"].strip()
+                if matched:
+                    phone_number, name = matched
                     
                     try:
-                        check_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M')
+                        # Date and time are already separate fields; avoid strptime's slow format parsing
+                        year, month, day = date_str.split('-')
+                        hours, minutes = time_str.split(':')[:2]
+                        check_time = datetime(int(year), int(month), int(day), int(hours), int(minutes))
                     except ValueError:
                         logger.error(f"Invalid timestamp format: {timestamp_str}")
                         return False
@@ -309,33 +644,24 @@ class LogProcessor:
                     hour = check_time.hour
                     msg_type = "in" if hour < 12 else "out"
                     
-                    if msg_type == "in":
-                        message_template = self.config.get(
-                            'messages', 'check_in' 
-                            #fallback=DEFAULT_CONFIG['messages']['check_in']
-                        )
-                    else:
-                        message_template = self.config.get(
-                            'messages', 'check_out'
-                            #fallback=DEFAULT_CONFIG['messages']['check_out']
-                        )
-                    
-                    message = message_template.format(
+                    message = self._templates[msg_type].format(
                         name=name,
                         time=check_time.strftime('%Y-%m-%d %H:%M')
                     )
                     
-                    if not self.already_sent(emp_code, msg_type):
-                        if self.sms_gateway.send_sms(phone_number, message):
-                            self.mark_as_sent(emp_code, msg_type)
-                            logger.info(f"Successfully processed {msg_type} message for {emp_code}")
-                            return True
-                        else:
-                            logger.error(f"Failed to send SMS for {emp_code}")
-                            return False
+                    today_key = self._sent_key(emp_code, msg_type)
+                    if not self.already_sent(today_key):
+                        self._pending.add(today_key)
+                        self.dispatcher.submit(
+                            phone_number,
+                            message,
+                            lambda sent: self._on_sms_done(today_key, emp_code, msg_type, sent)
+                        )
+                        logger.debug("Queued %s message for %s", msg_type, emp_code)
+                        return True
                     else:
-                        logger.info(
-                            f"Already sent {msg_type} SMS for {emp_code} today. Skipping."
+                        logger.debug(
+                            "Already sent %s SMS for %s today. Skipping.", msg_type, emp_code
                         )
                         return True
                 else:
@@ -350,61 +676,129 @@ class LogProcessor:
             logger.error(f"Unexpected error processing log: {str(e)}")
             return False
 
+def set_log_level(level_name: str) -> None:
+    """Set the root logger to the configured level"""
+    try:
+        logging.getLogger().setLevel(level_name.strip().upper())
+    except ValueError:
+        logger.warning(f"Unknown log level '{level_name}', keeping current level")
+
+def is_log_change(change: "Change", path: str) -> bool:
+    """Filter for watchfiles: only BioTime CSV logs, not the parent contact list"""
+    return path.endswith('.csv') and os.path.basename(path) != "parent_contact.csv"
+
+def watch_folder(log_processor: LogProcessor) -> None:
+    """Process log files as soon as the OS reports them added or modified"""
+    logger.info("Using file system events to detect new logs")
+    
+    # Only the log folder itself, matching what poll_folder scans. Waking up
+    # every SETTLE_SECONDS lets an unterminated last row be read even though
+    # no further event arrives for it.
+    for changes in watch(
+        log_processor.log_folder,
+        watch_filter=is_log_change,
+        recursive=False,
+        rust_timeout=int(SETTLE_SECONDS * 1000),
+        yield_on_timeout=True
+    ):
+        try:
+            paths = {path for change, path in changes
+                     if change in (Change.added, Change.modified)}
+            paths.update(log_processor.partial_logs())
+            for path in sorted(paths):
+                logger.debug("Detected log change: %s", path)
+                if not log_processor.process_log_for(path):
+                    logger.warning("Failed to process log file")
+        except Exception as e:
+            logger.error(f"Monitoring error: {str(e)}")
+            time.sleep(10)  # Wait before retrying
+            return  # Restart outer loop
+
+def poll_folder(log_processor: LogProcessor, polling_interval: int) -> None:
+    """Check the latest log file for new lines every polling_interval seconds"""
+    logger.info(f"Polling interval: {polling_interval} seconds")
+    last_seen = ""
+    
+    while True:
+        try:
+            latest = log_processor.get_latest_csv()
+            if latest:
+                if latest != last_seen:
+                    last_seen = latest
+                    logger.debug("Detected new log file: %s", latest)
+                if not log_processor.process_log_for(latest):
+                    logger.warning("Failed to process log file")
+            
+            time.sleep(polling_interval)
+            
+        except Exception as e:
+            logger.error(f"Monitoring error: {str(e)}")
+            time.sleep(10)  # Wait before retrying
+            return  # Restart outer loop
+
+# Command line arguments
+parser = argparse.ArgumentParser(
+    description='BioTime SMS Notification System',
+    epilog='Author: Kasim Lyee (kasiimlyee@gmail.com)'
+)
+parser.add_argument(
+    '--config', 
+    default='config.ini',
+    help='Path to configuration file'
+)
+parser.add_argument(
+    '--simulate',
+    action='store_true',
+    help='Run in simulation mode (no actual SMS sent)'
+)
+
+def run_monitor(log_processor: LogProcessor, config: ConfigManager) -> None:
+    """Monitor the log folder until an error requires a restart"""
+    polling_interval = config.getint('general', 'polling_interval', 60)
+    use_polling = config.getboolean('general', 'use_polling', False)
+    
+    logger.info("Starting BioTime SMS Notifier monitoring...")
+    logger.info(f"Watching folder: {log_processor.log_folder}")
+    
+    try:
+        log_processor.catch_up()
+        if use_polling or watch is None:
+            if not use_polling:
+                logger.warning("watchfiles is not installed, falling back to polling")
+            poll_folder(log_processor, polling_interval)
+        else:
+            watch_folder(log_processor)
+    finally:
+        log_processor.close()
+
 def main():
     """Main application entry point"""
+    # Arguments and configuration are loaded once; restarts only rebuild the workers
+    args = parser.parse_args()
+    
+    config = ConfigManager(args.config)
+    if not config.validate_config():
+        logger.error("Invalid configuration. Please check config.ini")
+        sys.exit(1)
+    
+    set_log_level(config.get('general', 'log_level', 'INFO'))
+    
+    # Read positions outlive restarts; only the first start takes a baseline,
+    # so rows written while restarting are still picked up
+    tail_state: Dict[str, Tuple[int, int]] = {}
+    baselined = False
+    
     while True:  # Infinite loop to auto-restart
         try:
-            # Parse command line arguments
-            parser = argparse.ArgumentParser(
-                description='BioTime SMS Notification System',
-                epilog='Author: Kasim Lyee (kasiimlyee@gmail.com)'
-            )
-            parser.add_argument(
-                '--config', 
-                default='config.ini',
-                help='Path to configuration file'
-            )
-            parser.add_argument(
-                '--simulate',
-                action='store_true',
-                help='Run in simulation mode (no actual SMS sent)'
-            )
-            args = parser.parse_args()
-            
-            # Initialize configuration
-            config = ConfigManager(args.config)
-            if not config.validate_config():
-                logger.error("Invalid configuration. Please check config.ini")
-                time.sleep(10)  # Wait before retrying
-                continue
-            
-            # Initialize SMS gateway and log processor
             sms_gateway = SMSGateway(config)
-            log_processor = LogProcessor(config, sms_gateway)
-            
-            # Main monitoring loop
-            polling_interval = config.getint('general', 'polling_interval', 60)
-            last_seen = ""
-            
-            logger.info("Starting BioTime SMS Notifier monitoring...")
-            logger.info(f"Watching folder: {log_processor.log_folder}")
-            logger.info(f"Polling interval: {polling_interval} seconds")
-            
-            while True:
-                try:
-                    latest = log_processor.get_latest_csv()
-                    if latest and latest != last_seen:
-                        last_seen = latest
-                        logger.info(f"Detected new log file: {latest}")
-                        if not log_processor.process_log():
-                            logger.warning("Failed to process log file")
-                    
-                    time.sleep(polling_interval)
-                    
-                except Exception as e:
-                    logger.error(f"Monitoring error: {str(e)}")
-                    time.sleep(10)  # Wait before retrying
-                    break  # Restart outer loop
+            try:
+                log_processor = LogProcessor(config, sms_gateway, tail_state)
+                if not baselined:
+                    log_processor.baseline_logs()
+                    baselined = True
+                run_monitor(log_processor, config)
+            finally:
+                sms_gateway.close()
         
         except Exception as e:
             logger.error(f"Script crashed: {str(e)}. Restarting in 10 seconds...")
@@ -0,0 +1,176 @@
+"""Tests for the BioTime SMS Notifier log processing"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import biotime_sms_notifier_110745 as notifier
+except ImportError:  # requests is not installed
+    notifier = None
+
+
+class FakeGateway:
+    """Records SMS instead of sending them"""
+
+    def __init__(self, error: Exception = None):
+        self.sent = []
+        self.error = error
+
+    def send_sms(self, phone_number: str, message: str) -> bool:
+        if self.error:
+            raise self.error
+        self.sent.append((phone_number, message))
+        return True
+
+
+def today() -> str:
+    return time.strftime('%Y-%m-%d')
+
+
+def row(emp_code: str, clock: str, date: str = None) -> str:
+    """One BioTime log row, tab separated and newline terminated"""
+    return f"{emp_code}\t{date or today()}\t{clock}\n"
+
+
+@unittest.skipIf(notifier is None, "requirements.txt is not installed")
+class LogProcessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        # A relative log folder, as operators often configure it
+        with open("config.ini", "w") as f:
+            f.write(
+                "[general]\nlog_folder = logs\nsent_log_file = sent.txt\n"
+                "[sms_gateway]\nurl = http://gateway\nusername = u\npassword = p\nsenderid = s\n"
+            )
+        os.makedirs("logs")
+        with open(os.path.join("logs", "parent_contact.csv"), "w") as f:
+            f.write("EmpCode,ParentNumber,Name\n1,2561,Alice\n2,2562,Bob\n3,2563,Carol\n")
+        self.log = os.path.join("logs", "attendance.csv")
+        with open(self.log, "w") as f:
+            f.write(row("1", "07:45") + row("2", "07:50"))
+        self.config = notifier.ConfigManager("config.ini")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self.tmp.cleanup()
+
+    def processor(self):
+        self.gateway = FakeGateway()
+        processor = notifier.LogProcessor(self.config, self.gateway)
+        self.addCleanup(processor.close)
+        return processor
+
+    def append(self, text: str) -> None:
+        with open(self.log, "a") as f:
+            f.write(text)
+
+    def sent_numbers(self, processor) -> list:
+        processor.dispatcher.close()
+        return [number for number, _ in self.gateway.sent]
+
+    def test_event_after_baseline_reads_only_appended_rows(self):
+        processor = self.processor()
+        processor.baseline_logs()
+        self.append(row("3", "07:55"))
+
+        # watchfiles reports absolute paths
+        self.assertTrue(processor.process_log_for(os.path.abspath(self.log)))
+        self.assertEqual(self.sent_numbers(processor), ["2563"])
+
+    def test_baseline_uses_real_inode_when_scandir_reports_zero(self):
+        processor = self.processor()
+        real_scandir = os.scandir
+
+        class ZeroInodeEntry:
+            """DirEntry as seen on Windows, where stat().st_ino is 0"""
+            def __init__(self, entry):
+                self.name, self.path = entry.name, entry.path
+            def stat(self):
+                return mock.Mock(st_ino=0, st_size=os.path.getsize(self.path))
+
+        class ZeroInodeScandir:
+            def __init__(self, path):
+                self._it = real_scandir(path)
+            def __enter__(self):
+                return (ZeroInodeEntry(entry) for entry in self._it.__enter__())
+            def __exit__(self, *exc):
+                return self._it.__exit__(*exc)
+
+        with mock.patch.object(notifier.os, "scandir", ZeroInodeScandir):
+            processor.baseline_logs()
+        self.append(row("3", "07:55"))
+
+        processor.process_log_for(self.log)
+        self.assertEqual(self.sent_numbers(processor), ["2563"])
+
+    def test_rows_from_earlier_days_are_skipped(self):
+        processor = self.processor()
+        processor.baseline_logs()
+        rotated = os.path.join("logs", "rotated.csv")
+        with open(rotated, "w") as f:
+            f.write(row("1", "08:00", date="2026-01-05") + row("1", "07:45"))
+
+        processor.process_log_for(rotated)
+        processor.dispatcher.close()
+        self.assertEqual(len(self.gateway.sent), 1)
+        self.assertIn(f"{today()} 07:45", self.gateway.sent[0][1])
+
+    def test_restart_resumes_from_last_read_offset(self):
+        first = self.processor()
+        first.baseline_logs()
+        self.append(row("2", "13:00"))
+        first.process_log_for(self.log)
+        first.close()
+
+        # Written while the notifier was restarting
+        self.append(row("3", "07:55"))
+        gateway = FakeGateway()
+        second = notifier.LogProcessor(self.config, gateway, first._tail_state)
+        self.addCleanup(second.close)
+        second.catch_up()
+        second.dispatcher.close()
+
+        self.assertEqual([number for number, _ in self.gateway.sent], ["2562"])
+        self.assertEqual([number for number, _ in gateway.sent], ["2563"])
+
+    def test_unterminated_last_row_is_read_once_settled(self):
+        processor = self.processor()
+        processor.baseline_logs()
+        self.append(row("3", "07:55").rstrip("\n"))
+
+        with mock.patch.object(notifier, "SETTLE_SECONDS", 0):
+            # First sight only records the size; the row may still be growing
+            self.assertEqual(processor.read_new_lines(self.log), [])
+            self.assertEqual(processor.partial_logs(), [self.log])
+            self.assertTrue(processor.process_log_for(self.log))
+            self.assertEqual(processor.partial_logs(), [])
+
+            # A newline written afterwards does not repeat the row
+            self.append("\n")
+            self.assertEqual(processor.read_new_lines(self.log), [])
+        self.assertEqual(self.sent_numbers(processor), ["2563"])
+
+
+@unittest.skipIf(notifier is None, "requirements.txt is not installed")
+class SMSDispatcherTest(unittest.TestCase):
+
+    def test_unexpected_error_still_reports_failure(self):
+        results = []
+        dispatcher = notifier.SMSDispatcher(FakeGateway(error=KeyError("boom")), workers=1)
+        dispatcher.submit("256700", "hello", results.append)
+        dispatcher.close()
+
+        self.assertEqual(results, [False])
+
+
+if __name__ == "__main__":
+    unittest.main()